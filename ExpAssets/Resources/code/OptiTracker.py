@@ -1,4 +1,6 @@
 import os
+from collections import deque
+from threading import Lock
 import numpy as np
 import sqlite3
 from scipy.signal import butter, sosfiltfilt
@@ -12,6 +14,14 @@ from pprint import pprint
 # incorporate checks to ensure frames queried match expected marker count
 # refactor nomeclature about frame indexing/querying
 
+# per-frame position record, as returned by position()
+POSITION_DTYPE = [
+    ("frame_number", "i8"),
+    ("pos_x", "i8"),
+    ("pos_y", "i8"),
+    ("pos_z", "i8"),
+]
+
 
 class OptiTracker(object):
     """
@@ -56,7 +66,15 @@ class OptiTracker(object):
 
         self.__sample_rate = sample_rate
         self.__data_dir = data_dir
+        self.__validate_window_size(window_size)
         self.__window_size = window_size
+        self.__update_velocity_scale()
+
+        # frames are added from the NatNet thread, whilst queries come from the experiment's
+        self.__frames_lock = Lock()
+        # most recent frames, as fed by add_frame(); spares re-reading the data file
+        self.__frames = deque()
+        self.__resize_frames()
         # self.db = self.__connect(db_name)
 
         # self.cursor = self.db.cursor()
@@ -102,6 +120,9 @@ class OptiTracker(object):
     def data_dir(self, data_dir: str) -> None:
         """Set the data directory path."""
         self.__data_dir = data_dir
+        # buffered frames belong to the previous file
+        with self.__frames_lock:
+            self.__frames.clear()
 
     @property
     def sample_rate(self) -> int:
@@ -112,6 +133,8 @@ class OptiTracker(object):
     def sample_rate(self, sample_rate: int) -> None:
         """Set the sampling rate."""
         self.__sample_rate = sample_rate
+        self.__update_velocity_scale()
+        self.__resize_frames()
 
     @property
     def window_size(self) -> int:
@@ -121,7 +144,31 @@ class OptiTracker(object):
     @window_size.setter
     def window_size(self, window_size: int) -> None:
         """Set the window size."""
+        self.__validate_window_size(window_size)
         self.__window_size = window_size
+        self.__update_velocity_scale()
+        self.__resize_frames()
+
+    def add_frame(self, markers: list) -> None:
+        """
+        Buffer a frame of marker data, making it available to queries without a file read.
+
+        Args:
+            markers (list): Marker dicts for one frame, each with frame_number, pos_x, pos_y, pos_z.
+        """
+        markers = [marker for marker in markers if marker is not None]
+        if not markers:
+            return
+
+        frame = np.zeros(len(markers), dtype=POSITION_DTYPE)
+        frame["frame_number"] = markers[0]["frame_number"]
+
+        # same scaling as applied to file data, see __query_frames()
+        for col in ["pos_x", "pos_y", "pos_z"]:
+            frame[col] = np.rint(np.array([marker[col] for marker in markers]) * 1000)
+
+        with self.__frames_lock:
+            self.__frames.append(frame)
 
     def velocity(self, num_frames: int = 0) -> float:
         """Calculate and return the current velocity."""
@@ -134,10 +181,28 @@ class OptiTracker(object):
         frames = self.__query_frames(num_frames)
         return self.__velocity(frames)
 
-    def position(self) -> np.ndarray:
-        """Get the current position of markers."""
+    def position(self, out: np.ndarray = np.array([])) -> np.ndarray:
+        """
+        Get the current position of markers.
+
+        Args:
+            out (np.ndarray, optional): Preallocated 1-row POSITION_DTYPE array to write into,
+                sparing an allocation per call when polled. Allocated if not provided.
+
+        Returns:
+            np.ndarray: Mean marker position (out, if provided)
+        """
         frame = self.__query_frames(num_frames=1)
-        return self.__column_means(smooth = False, frames = frame)
+
+        if out.size == 0:
+            out = np.zeros(1, dtype=POSITION_DTYPE)
+
+        # only one frame, so average markers directly instead of grouping by frame
+        out["pos_x"] = frame["pos_x"].mean()
+        out["pos_y"] = frame["pos_y"].mean()
+        out["pos_z"] = frame["pos_z"].mean()
+
+        return out
 
     def distance(self, num_frames: int = 0) -> float:
         """Calculate and return the distance traveled over the specified number of frames."""
@@ -157,16 +222,34 @@ class OptiTracker(object):
 
         Returns:
             float: Calculated velocity in cm/s
-        """
-        if self.__window_size < 2:
-            raise ValueError("Window size must cover at least two frames.")
 
+        Note:
+            Window size is validated whenever it is set (see window_size), rather than on every call here.
+        """
         if len(frames) == 0:
             frames = self.__query_frames()
 
         euclidean_distance = self.__euclidean_distance(frames)
 
-        return euclidean_distance / (self.__window_size / self.__sample_rate)
+        return euclidean_distance * self.__velocity_scale
+
+    def __update_velocity_scale(self) -> None:
+        """Cache the distance-to-velocity factor (1 / window duration), so velocity needn't divide."""
+        # NOTE: window size is validated when set, so is never zero here
+        self.__velocity_scale = self.__sample_rate / self.__window_size
+
+    def __resize_frames(self) -> None:
+        """Size the frame buffer to a second's worth of frames, or a full window if longer."""
+        # NOTE: keeps the most recent frames already buffered
+        with self.__frames_lock:
+            self.__frames = deque(
+                self.__frames, maxlen=max(self.__sample_rate, self.__window_size)
+            )
+
+    def __validate_window_size(self, window_size: int) -> None:
+        """Reject windows too narrow to calculate velocity over."""
+        if window_size < 2:
+            raise ValueError("Window size must cover at least two frames.")
 
     def __euclidean_distance(self, frames: np.ndarray = np.array([])) -> float:
         """
@@ -264,45 +347,15 @@ class OptiTracker(object):
         # print("OptiTracker column_means, got frames:")
         # pprint(frames)
 
-        # Create output array with the correct dtype
-        means = np.zeros(
-            len(frames) // self.__marker_count,
-            dtype=[
-                ("frame_number", "i8"),
-                ("pos_x", "i8"),
-                ("pos_y", "i8"),
-                ("pos_z", "i8"),
-            ],
-        )
-
-        # Group by marker (every nth row where n is marker_count)
-        start = min(frames["frame_number"])
-        stop = max(frames["frame_number"]) + 1
-
-        for frame_number in range(start, stop):
-            this_frame = frames[frames["frame_number"] == frame_number,]
-
-            # print("OptiTracker column_means, this frame:")
-            # pprint(this_frame)
-
-            # if not len(frame):
-            #     tmp = frame_number - 1
-            #     while not len(frame) and tmp >= start:
-            #         frame = frames[frames["frame_number"] == tmp,]
-            #         tmp -= 1
+        # Group rows by frame, then average each group's positions in one pass per column
+        frame_numbers, group = np.unique(frames["frame_number"], return_inverse=True)
+        group_sizes = np.bincount(group)
 
+        means = np.zeros(len(frame_numbers), dtype=POSITION_DTYPE)
+        means["frame_number"] = frame_numbers
 
-            idx = frame_number - start
-            means[idx]["pos_x"] = np.mean(this_frame["pos_x"])
-            means[idx]["pos_y"] = np.mean(this_frame["pos_y"])
-            means[idx]["pos_z"] = np.mean(this_frame["pos_z"])
-
-            idx += 1
-
-            # except RuntimeWarning as e:
-            #     means[idx]["pos_x"] = 0.0
-            #     means[idx]["pos_y"] = 0.0
-            #     means[idx]["pos_z"] = 0.0
+        for col in ["pos_x", "pos_y", "pos_z"]:
+            means[col] = np.bincount(group, weights=frames[col]) / group_sizes
 
         # if smooth:
         #     means = self.__smooth(frames=means)
@@ -311,7 +364,7 @@ class OptiTracker(object):
 
     def __query_frames(self, num_frames: int = 0) -> np.ndarray:
         """
-        Query and process frame data from the data file.
+        Query and process frame data, from buffered frames if possible, otherwise the data file.
 
         Args:
             num_frames (int, optional): Number of frames to query. Defaults to window_size when empty.
@@ -324,24 +377,36 @@ class OptiTracker(object):
             FileNotFoundError: If data directory does not exist
         """
 
+        if num_frames < 0:
+            raise ValueError("Number of frames cannot be negative.")
+
+        if num_frames == 0:
+            num_frames = self.__window_size
+
+        # serve from buffered frames when they span the request
+        with self.__frames_lock:
+            frames = list(self.__frames)
+        if len(frames) >= num_frames:
+            return np.concatenate(frames[-num_frames:])
+
         if self.__data_dir == "":
             raise ValueError("No data directory was set.")
 
         if not os.path.exists(self.__data_dir):
             raise FileNotFoundError(f"Data directory not found at:\n{self.__data_dir}")
 
-        if num_frames < 0:
-            raise ValueError("Number of frames cannot be negative.")
+        with open(self.__data_dir, "rb") as file:
+            header = file.readline().decode().strip().split(",")
 
-        with open(self.__data_dir, "r") as file:
-            header = file.readline().strip().split(",")
+            if any(
+                col not in header for col in ["frame_number", "pos_x", "pos_y", "pos_z"]
+            ):
+                raise ValueError(
+                    "Data file must contain columns named frame_number, pos_x, pos_y, pos_z."
+                )
 
-        if any(
-            col not in header for col in ["frame_number", "pos_x", "pos_y", "pos_z"]
-        ):
-            raise ValueError(
-                "Data file must contain columns named frame_number, pos_x, pos_y, pos_z."
-            )
+            # only parse the rows spanning the requested frames, not the whole file
+            rows = self.__read_tail(file, header.index("frame_number"), num_frames)
 
         dtype_map = [
             # coerce expected columns to float, int, string (default)
@@ -357,16 +422,11 @@ class OptiTracker(object):
         ]
 
         # read in data now that columns have been validated and typed
-        data = np.genfromtxt(
-            self.__data_dir, delimiter=",", dtype=dtype_map, skip_header=1
-        )
+        data = np.loadtxt(rows, delimiter=",", dtype=dtype_map, ndmin=1)
 
         for col in ['pos_x', 'pos_y', 'pos_z']:
             data[col] = np.rint(data[col] * 1000).astype(np.int32)
 
-        if num_frames == 0:
-            num_frames = self.__window_size
-
         # Calculate which frames to include
         last_frame = data["frame_number"][-1]
         lookback = last_frame - num_frames
@@ -375,7 +435,43 @@ class OptiTracker(object):
         data = data[data["frame_number"] > lookback]
 
         return data
-    
+
+    def __read_tail(self, file, frame_col: int, num_frames: int) -> list:
+        """
+        Read rows from the end of an open data file, just far enough back to span num_frames.
+
+        Args:
+            file: Binary file handle, positioned at the start of the first data row.
+            frame_col (int): Index of the frame_number column.
+            num_frames (int): Number of (most recent) frames that must be covered.
+
+        Returns:
+            list: Data rows (as strings), oldest first.
+        """
+        data_start = file.tell()
+        end = file.seek(0, os.SEEK_END)
+        chunk_size = 4096
+
+        while True:
+            start = max(data_start, end - chunk_size)
+            file.seek(start)
+            rows = file.read(end - start).decode().splitlines()
+
+            if start == data_start:
+                return rows
+
+            # first row is likely partial, as the chunk won't start on a line break
+            rows = rows[1:]
+
+            # done once the oldest row read precedes the requested frames
+            if len(rows) > 1:
+                oldest = int(rows[0].split(",")[frame_col])
+                newest = int(rows[-1].split(",")[frame_col])
+                if oldest <= newest - num_frames:
+                    return rows
+
+            chunk_size *= 2
+
     def __connect(self, db_name: str = "optitracker.db") -> sqlite3.Connection:
         """
         Connect to the SQLite database.
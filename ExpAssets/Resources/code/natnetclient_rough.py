@@ -15,8 +15,10 @@
 
 # OptiTrack NatNet direct depacketization library for Python 3.x
 
+import ctypes
 import socket
 import struct
+import sys
 import time
 from threading import Thread
 from typing import Any, Callable, List, Tuple, Union
@@ -52,6 +54,21 @@ def get_message_id(bytestream: bytes) -> int:
     return message_id
 
 
+# Win32 SetThreadPriority level
+THREAD_PRIORITY_TIME_CRITICAL = 15
+
+
+def raise_thread_priority() -> None:
+    # Ask the OS to schedule the calling thread ahead of others (windows only),
+    # so frames are drained promptly even while the main thread is busy
+    if sys.platform != "win32":
+        return
+    kernel32 = ctypes.windll.kernel32
+    kernel32.SetThreadPriority(
+        kernel32.GetCurrentThread(), THREAD_PRIORITY_TIME_CRITICAL
+    )
+
+
 class NatNetClient:
     print_level = 0
 
@@ -396,6 +413,9 @@ class NatNetClient:
     def __data_thread_function(
         self, in_socket: socket.socket, stop: Callable, gprint_level: Callable
     ) -> int:
+        # thread mostly blocks on recvfrom, so priority costs little but cuts wake-up latency
+        raise_thread_priority()
+
         message_id_dict = {}
         # 64k buffer size
         recv_buffer_size = 64 * 1024
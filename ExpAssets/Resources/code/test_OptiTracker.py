@@ -102,6 +102,15 @@ def test_velocity_invalid_window():
         tracker.velocity(num_frames=1)
 
 
+def test_invalid_window_size(tracker):
+    with pytest.raises(ValueError, match="Window size must cover at least two frames."):
+        OptiTracker(marker_count=1, window_size=1)
+
+    with pytest.raises(ValueError, match="Window size must cover at least two frames."):
+        tracker.window_size = 0
+    assert tracker.window_size == 5
+
+
 def test_velocity(tracker):
     velocity = tracker.velocity(num_frames=2)
     assert isinstance(velocity, float)
@@ -140,3 +149,62 @@ def test_invalid_data_format(tmp_path):
         match="Data file must contain columns named frame, pos_x, pos_y, pos_z.",
     ):
         tracker.position()
+
+
+def test_position_large_file(tmp_path):
+    # spans several read chunks, so only the file's tail is parsed
+    rows = ["frame_number,pos_x,pos_y,pos_z"]
+    for frame in range(1, 1001):
+        for marker in range(3):
+            rows.append(f"{frame},{frame + marker},{frame},{frame}")
+    data_file = tmp_path / "large_data.csv"
+    data_file.write_text("\n".join(rows) + "\n")
+
+    tracker = OptiTracker(marker_count=3)
+    tracker.data_dir = str(data_file)
+
+    position = tracker.position()
+    assert position["pos_x"].item() == 1001 * 1000
+    assert position["pos_z"].item() == 1000 * 1000
+    assert tracker.distance(num_frames=500) == np.sqrt(3 * 499**2) * 1000
+
+
+def test_buffered_frames(tracker):
+    # buffered frames are served without touching the data file
+    for frame in range(1, 6):
+        tracker.add_frame(
+            [
+                {"frame_number": frame, "pos_x": frame + marker, "pos_y": frame, "pos_z": 0.0}
+                for marker in range(3)
+            ]
+        )
+
+    position = tracker.position()
+    assert position["pos_x"].item() == 6 * 1000
+    assert position["pos_y"].item() == 5 * 1000
+    assert tracker.distance(num_frames=5) == 4 * np.sqrt(2) * 1000
+
+    # switching files drops frames buffered for the previous one
+    tracker.data_dir = tracker.data_dir
+    assert tracker.position()["pos_x"].item() == 10 * 1000
+
+
+def test_buffer_resize():
+    tracker = OptiTracker(marker_count=1, sample_rate=10)
+    # no data file exists, so queries can only be served from buffered frames
+    tracker.data_dir = "/nonexistent/markers.csv"
+
+    # window outgrows a second's worth of frames, buffer must grow with it
+    tracker.window_size = 20
+    for frame in range(1, 21):
+        tracker.add_frame(
+            [{"frame_number": frame, "pos_x": frame / 1000, "pos_y": 0.0, "pos_z": 0.0}]
+        )
+
+    assert tracker.distance() == 19
+    assert tracker.velocity() == 19 * 10 / 20
+
+    # changing sample rate keeps already buffered frames
+    tracker.sample_rate = 30
+    assert tracker.distance() == 19
+
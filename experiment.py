@@ -4,8 +4,16 @@ __author__ = "Brett Feltmate"
 
 # external imports
 import os
-from csv import DictWriter
+import warnings
+from contextlib import suppress
+from csv import writer as csv_writer
+from operator import itemgetter
+from queue import Empty, Full, Queue
 from random import randrange
+from threading import Thread
+from time import monotonic, perf_counter_ns, sleep
+
+import numpy as np
 
 # local imports
 from get_key_state import get_key_state  # type: ignore[import]
@@ -18,12 +26,10 @@ from klibs.KLExceptions import TrialException
 from klibs.KLGraphics import KLDraw as kld
 from klibs.KLGraphics import blit, fill, flip, clear
 from klibs.KLUserInterface import any_key, key_pressed, ui_request
-from klibs.KLUtilities import hide_mouse_cursor, line_segment_len, pump
-from klibs.KLBoundary import CircleBoundary, BoundarySet
-from klibs.KLTime import CountDown
+from klibs.KLUtilities import hide_mouse_cursor, pump
 
 from natnetclient_rough import NatNetClient  # type: ignore[import]
-from OptiTracker import OptiTracker  # type: ignore[import]
+from OptiTracker import OptiTracker, POSITION_DTYPE  # type: ignore[import]
 from pyfirmata import serial
 
 # experiment constants
@@ -34,6 +40,9 @@ GO_SIGNAL_ONSET = (500, 2000)
 REACH_WINDOW_POST_GO_SIGNAL = 850
 POST_REACH_WINDOW = 1000
 REACH_DISTANCE_THRESHOLD = (100, 200)
+UI_POLL_INTERVAL = 16  # ms, ~1 frame @ 60Hz
+KEY_POLL_INTERVAL = 2  # ms, between premature release checks
+POSITION_POLL_INTERVAL = 1  # ms, well under the tracker's frame interval
 
 # audio
 TONE_DURATION = 100
@@ -41,6 +50,15 @@ TONE_SHAPE = "sine"
 TONE_FREQ = 784  # ridin' on yo G5 airplane
 TONE_VOLUME = 1.0
 
+# tracking
+POS_SCALE = 3  # marker position (mm) to px
+MARKER_QUEUE_SIZE = 1024  # marker sets buffered between listener & writer
+MARKER_BATCH_SIZE = 32  # max marker sets written per flush
+MARKER_WRITE_BUFFER = 1 << 16  # bytes, comfortably above one batch's worth of rows
+
+# goggles
+COMPORT = "COM6"
+BAUDRATE = 9600
 
 # fills
 WHITE = (255, 255, 255, 255)
@@ -54,6 +72,7 @@ SMALL = "small"
 LARGE = "large"
 TARGET = "target"
 DISTRACTOR = "distractor"
+HIDDEN = "hidden"
 GBYK = "GBYK"
 KBYG = "KBYG"
 OPEN = b"55"
@@ -75,11 +94,48 @@ class GripApertureRedux(klibs.Experiment):
         # setup motive client
         self.nnc = NatNetClient()
 
+        # polled every reach-loop iteration, so bind everything it touches as locals
+        # NOTE: positions are written into a reused buffer, rather than allocated per poll
+        def get_hand_pos(
+            position=self.ot.position,
+            buffer=np.zeros(1, dtype=POSITION_DTYPE),
+            scale=POS_SCALE,
+        ) -> tuple:
+            """Return the current (x, z) hand position, scaled to px."""
+            # NOTE: int() on the field scalars is cheaper than .item() on the whole record
+            pos = position(out=buffer)
+            return (int(pos["pos_x"][0]) * scale, int(pos["pos_z"][0]) * scale)
+
+        self.get_hand_pos = get_hand_pos
+
         # pass marker set listener to client for callback
         self.nnc.markers_listener = self.marker_set_listener
 
+        # marker sets are written to disk on their own thread, keeping I/O off the listener's
+        self.marker_queue = Queue(maxsize=MARKER_QUEUE_SIZE)
+        self.marker_writer = Thread(target=self.marker_writer_loop, daemon=True)
+        self.marker_writer.start()
+
         # setup firmata board (plato goggle controller)
-        self.goggles = serial.Serial(port="COM6", baudrate=9600)
+        # NOTE: write_timeout=0 makes writes non-blocking; commands are never read back
+        self.goggles = serial.Serial(
+            port=COMPORT, baudrate=BAUDRATE, timeout=0, write_timeout=0
+        )
+        if os.name == "nt":
+            self.goggles.set_buffer_size(rx_size=64, tx_size=64)
+
+        # USB-serial adapters (FTDI et al.) hold partial packets for up to 16ms by default
+        # NOTE: only settable from here on linux; on windows, lower the port's
+        # "Latency Timer" (Device Manager > Port Settings > Advanced) to 1ms instead
+        if hasattr(self.goggles, "set_low_latency_mode"):
+            try:
+                self.goggles.set_low_latency_mode(True)
+            except (OSError, ValueError):
+                pass  # not all adapters/drivers support it
+
+        # discard anything left over from before the port was (re)opened
+        self.goggles.reset_input_buffer()
+        self.goggles.reset_output_buffer()
 
         # 12cm between placeholder centers
         self.locs = {
@@ -92,16 +148,47 @@ class GripApertureRedux(klibs.Experiment):
             LARGE: DIAM_LARGE,
         }
 
-        # spawn object placeholders
+        # prebuild grasp zones (center x, center y, radius^2) for every location/size combination
+        # NOTE: tested inline within the reach loop, sparing a BoundarySet dispatch per poll
+        self.grasp_zones = {
+            (loc, size): (self.locs[loc][0], self.locs[loc][1], self.sizes[size] ** 2)
+            for loc in (LEFT, RIGHT)
+            for size in (SMALL, LARGE)
+        }
+
+        # spawn object placeholders, one per size & fill they're ever drawn with
+        annuli = {
+            color: {
+                SMALL: kld.Annulus(DIAM_SMALL, BRIMWIDTH, fill=color),
+                LARGE: kld.Annulus(DIAM_LARGE, BRIMWIDTH, fill=color),
+            }
+            for color in (WHITE, GRUE)
+        }
+
+        # fills never change, so rasterize now; draws during trials then only blit
+        for holders in annuli.values():
+            for holder in holders.values():
+                holder.render()
+
+        # NOTE: until revealed, target placeholders are drawn as distractors (HIDDEN)
         self.placeholders = {
-            TARGET: {
-                SMALL: kld.Annulus(DIAM_SMALL, BRIMWIDTH),
-                LARGE: kld.Annulus(DIAM_LARGE, BRIMWIDTH),
-            },
-            DISTRACTOR: {
-                SMALL: kld.Annulus(DIAM_SMALL, BRIMWIDTH),
-                LARGE: kld.Annulus(DIAM_LARGE, BRIMWIDTH),
-            },
+            TARGET: annuli[WHITE],
+            DISTRACTOR: annuli[GRUE],
+            HIDDEN: annuli[GRUE],
+        }
+
+        # prop placement instructions sit in the upper third of the screen
+        self.prep_msg_loc = [P.screen_c[0], P.screen_c[1] // 3]  # type: ignore[attr-defined]
+
+        # placeholders only ever sit at fixed spots, so precompute their top-left
+        # blit coords (registration=7) rather than re-centering them on every draw
+        self.blit_locs = {
+            (loc, size): (
+                self.locs[loc][0] - holder.surface_width // 2,
+                self.locs[loc][1] - holder.surface_height // 2,
+            )
+            for loc in (LEFT, RIGHT)
+            for size, holder in self.placeholders[TARGET].items()
         }
 
         # spawn go signal
@@ -117,30 +204,29 @@ class GripApertureRedux(klibs.Experiment):
             self.block_sequence = P.task_order  # type: ignore[attr-defined]
 
         # create data directories
-        if not os.path.exists("OptiData"):
-            os.mkdir("OptiData")
+        os.makedirs(f"OptiData/{P.condition}", exist_ok=True)
 
-        if not os.path.exists(f"OptiData/{P.condition}"):
-            os.mkdir(f"OptiData/{P.condition}")
+        self.participant_dir = f"OptiData/{P.condition}/{P.p_id}"
 
-        os.mkdir(f"OptiData/{P.condition}/{P.p_id}")
-        os.mkdir(f"OptiData/{P.condition}/{P.p_id}/testing")
+        os.mkdir(self.participant_dir)
+        os.mkdir(f"{self.participant_dir}/testing")
 
         if P.run_practice_blocks:
-            os.mkdir(f"OptiData/{P.condition}/{P.p_id}/practice")
+            os.mkdir(f"{self.participant_dir}/practice")
 
     def block(self):
 
-        self.block_task = self.block_sequence.pop(0)
+        # NOTE: P.block_number counts practice blocks too, so maps 1:1 onto the sequence
+        self.block_task = self.block_sequence[P.block_number - 1]
 
-        self.block_dir = f"OptiData/{P.condition}/{P.p_id}"
-        self.block_dir += "/practice" if P.practicing else "/testing"
-        self.block_dir += f"/{self.block_task}"
+        phase = "practice" if P.practicing else "testing"
+        self.block_dir = f"{self.participant_dir}/{phase}/{self.block_task}"
 
-        if os.path.exists(self.block_dir):
-            raise RuntimeError(f"Data directory already exists at {self.block_dir}")
-        else:
+        # NOTE: mkdir fails on existing dirs itself, no need to stat beforehand
+        try:
             os.mkdir(self.block_dir)
+        except FileExistsError:
+            raise RuntimeError(f"Data directory already exists at {self.block_dir}")
 
         # TODO: Proper instructions
         instrux = (
@@ -159,9 +245,17 @@ class GripApertureRedux(klibs.Experiment):
     def trial_prep(self):
 
         self.reach_threshold = randrange(*REACH_DISTANCE_THRESHOLD, step=10)
+        # compared against squared distances, sparing a sqrt per poll
+        self.reach_threshold_sq = self.reach_threshold**2
 
         # setup trial events/timings
-        self.evm.add_event(label="go_signal", onset=randrange(*GO_SIGNAL_ONSET))
+        # NOTE: onsets are also cached as deadlines (ms into trial), which polling loops
+        # compare against trial time directly rather than resolving events by label
+        self.go_signal_onset = randrange(*GO_SIGNAL_ONSET)
+        self.reach_window_closes = self.go_signal_onset + REACH_WINDOW_POST_GO_SIGNAL
+        self.trial_times_out = self.reach_window_closes + POST_REACH_WINDOW
+
+        self.evm.add_event(label="go_signal", onset=self.go_signal_onset)
         self.evm.add_event(
             label="reach_window_closed",
             onset=REACH_WINDOW_POST_GO_SIGNAL,
@@ -174,47 +268,52 @@ class GripApertureRedux(klibs.Experiment):
         # determine targ/dist locations
         self.distractor_loc = LEFT if self.target_loc == RIGHT else RIGHT  # type: ignore[attr-defined]
 
-        # now that object locations are determined, create respective boundaries
-        self.target_boundary = CircleBoundary(
-            label="target",
-            center=self.locs[self.target_loc],  # type: ignore[attr-defined]
-            radius=self.sizes[self.target_size],  # type: ignore[attr-defined]
-        )
+        # now that object locations are determined, fetch respective grasp zones
+        self.target_zone = self.grasp_zones[(self.target_loc, self.target_size)]  # type: ignore[attr-defined]
+        self.distractor_zone = self.grasp_zones[(self.distractor_loc, self.distractor_size)]  # type: ignore[attr-defined]
 
-        self.distractor_boundary = CircleBoundary(
-            label="distractor",
-            center=self.locs[self.distractor_loc],  # type: ignore[attr-defined]
-            radius=self.sizes[self.distractor_size],  # type: ignore[attr-defined]
+        # resolve placeholders & locations once, rather than on every draw
+        distractor = (
+            self.placeholders[DISTRACTOR][self.distractor_size],  # type: ignore[attr-defined]
+            self.blit_locs[(self.distractor_loc, self.distractor_size)],  # type: ignore[attr-defined]
         )
+        target_loc = self.blit_locs[(self.target_loc, self.target_size)]  # type: ignore[attr-defined]
 
-        self.bounds = BoundarySet([self.target_boundary, self.distractor_boundary])
+        # keyed by whether target is to be revealed
+        self.stimuli = {
+            True: (distractor, (self.placeholders[TARGET][self.target_size], target_loc)),  # type: ignore[attr-defined]
+            False: (distractor, (self.placeholders[HIDDEN][self.target_size], target_loc)),  # type: ignore[attr-defined]
+        }
 
         # instruct experimenter on prop placements
-        self.goggles.write(CLOSE)
+        self.goggles_cmd(CLOSE)
         self.present_stimuli(prep=True)
 
+        # NOTE: key events queue up between pumps, so sleeping in between loses none
         while True:  # participant readiness signalled by keypress
             q = pump(True)
             if key_pressed(key="space", queue=q):
                 break
+            sleep(UI_POLL_INTERVAL / 1000)
 
         self.present_stimuli()  # reset display for trial start
 
         self.ot.data_dir = (
-            f"{self.block_dir}/"
-            + f"trial_{P.trial_number}"
-            + f"_targetOn_{self.target_loc}"  # type: ignore[attr-defined]
-            + f"_targetSize_{self.target_size}"  # type: ignore[attr-defined]
-            + f"_distractorSize_{self.distractor_size}"  # type: ignore[attr-defined]
-            + "_hand_markers.csv"
+            f"{self.block_dir}/trial_{P.trial_number}"
+            f"_targetOn_{self.target_loc}"  # type: ignore[attr-defined]
+            f"_targetSize_{self.target_size}"  # type: ignore[attr-defined]
+            f"_distractorSize_{self.distractor_size}"  # type: ignore[attr-defined]
+            "_hand_markers.csv"
         )
 
+        # point marker writer to this trial's file
+        self.marker_queue.put(self.ot.data_dir)
+        self.markers_dropped = 0
+
         self.nnc.startup()  # start marker tracking
 
         # NOTE: To ensure that file exists before OptiTracker tries to access it.
-        nnc_lead_time = CountDown(0.5)
-        while nnc_lead_time.counting():
-            _ = ui_request()
+        self.idle_wait(0.5)
 
     def trial(self):  # type: ignore[override]
         hide_mouse_cursor()
@@ -226,18 +325,34 @@ class GripApertureRedux(klibs.Experiment):
         self.target_visible = False
         self.object_grasped = None
 
-        start_pos = self.ot.position()
-        start_pos = (start_pos["pos_x"][0].item() * 3, start_pos["pos_z"][0].item() * 3)
+        start_pos = self.get_hand_pos()
 
         # immediately present trials in KBYG trials
         if self.block_task == "KBYG":
             self.present_stimuli(target=True)
             self.target_visible = True
 
+        # bind polling-loop lookups to locals
+        evm = self.evm
+        go_signal_onset = self.go_signal_onset
+        reach_window_closes = self.reach_window_closes
+        ui = ui_request
+        key_state = get_key_state
+
         # restrict movement until go signal received
-        while self.evm.before("go_signal"):
-            _ = ui_request()
-            if get_key_state("space") == 0:
+        # NOTE: a premature release needn't be caught to the ms, so key state is polled
+        # at a coarser rate; the loop itself still spins to keep go signal onset tight
+        key_poll_ns = KEY_POLL_INTERVAL * 1_000_000
+        next_key_poll = 0
+        while evm.trial_time_ms < go_signal_onset:
+            _ = ui()
+
+            now = perf_counter_ns()
+            if now < next_key_poll:
+                continue
+            next_key_poll = now + key_poll_ns
+
+            if key_state("space") == 0:
                 self.evm.reset()
 
                 fill()
@@ -250,65 +365,88 @@ class GripApertureRedux(klibs.Experiment):
                 # TODO: keep register of aborted trials
                 raise TrialException("Premature reach.")
 
-        # used to calculate RT, also logged for analysis purposes
+        # logged for analysis purposes
         go_signal_onset_time = self.evm.trial_time_ms
+        # used to calculate RT/MT; integer ns deltas are exact & cheap to subtract
+        go_signal_onset_ns = perf_counter_ns()
 
+        # goggles are slower to actuate, so fire them first to overlap with tone onset
+        # NOTE: not drained, write_timeout=0 lets the UART send it while monitoring starts
+        self.goggles_cmd(OPEN, drain=False)  # open goggles
         self.go_signal.play()  # play go-signal
-        self.goggles.write(OPEN)  # open goggles
-
-        # monitor movement status
-        while self.evm.before("reach_window_closed"):
-            _ = ui_request()
 
-            # key release indicates reach is in motion
-            if self.rt is None:
-                if get_key_state("space") == 0:
-                    # recorde time from go signal to reach onset
-                    self.rt = self.evm.trial_time_ms - go_signal_onset_time
-
-            # Whilst reach in motion
+        # instance state is only written on change; loop reads the local copies
+        get_hand_pos = self.get_hand_pos
+        target_x, target_y, target_r_sq = self.target_zone
+        distractor_x, distractor_y, distractor_r_sq = self.distractor_zone
+        reach_threshold_sq = self.reach_threshold_sq
+        start_x, start_y = start_pos
+        rt = self.rt
+        target_visible = self.target_visible
+        object_grasped = self.object_grasped
+
+        # reach proceeds through onset -> threshold -> grasp; each stage polls only
+        # what it's waiting on, all bounded by the reach window
+
+        # key release indicates reach is in motion
+        while rt is None and evm.trial_time_ms < reach_window_closes:
+            _ = ui()
+            if key_state("space") == 0:
+                # record time from go signal to reach onset
+                reach_onset_ns = perf_counter_ns()
+                rt = self.rt = (reach_onset_ns - go_signal_onset_ns) // 1_000_000
+
+        # NOTE: positions only update once per tracker frame, so sleep briefly between
+        # polls rather than spin; key release (RT) is still polled flat out above
+        position_poll = POSITION_POLL_INTERVAL / 1000
+
+        # Present target once reach exceeds threshold
+        # NOTE: only relevant for GBYK trials, will already be True during KBYG trials
+        # TODO: add in time constraint for a half-assed velocity threshold
+        while not target_visible and evm.trial_time_ms < reach_window_closes:
+            _ = ui()
+            sleep(position_poll)
+            x, y = get_hand_pos()
+            dx = x - start_x
+            dy = y - start_y
+            if dx * dx + dy * dy > reach_threshold_sq:
+                self.present_stimuli(target=True)
+                target_visible = self.target_visible = True
+                # note time at which target was presented
+                self.target_onset_time = self.evm.trial_time_ms
+
+        # log if & which object has been grasped
+        # NOTE: zones can overlap (large props), target takes precedence when they do
+        while object_grasped is None and evm.trial_time_ms < reach_window_closes:
+            _ = ui()
+            sleep(position_poll)
+            x, y = get_hand_pos()
+            dx = x - target_x
+            dy = y - target_y
+            if dx * dx + dy * dy <= target_r_sq:
+                object_grasped = self.object_grasped = TARGET
             else:
-                # fetch current position
-                curr_pos = self.ot.position()
-                curr_pos = (
-                    curr_pos["pos_x"][0].item() * 3,
-                    curr_pos["pos_z"][0].item() * 3,
-                )
+                dx = x - distractor_x
+                dy = y - distractor_y
+                if dx * dx + dy * dy <= distractor_r_sq:
+                    object_grasped = self.object_grasped = DISTRACTOR
 
-                # Present target once reach exceeds threshold
-                # NOTE: only relevant for GBYK trials, will already be True during KBYG trials
-                # TODO: add in time constraint for a half-assed velocity threshold
-                if not self.target_visible:
-                    if line_segment_len(start_pos, curr_pos) > self.reach_threshold:
-                        self.present_stimuli(target=True)
-                        self.target_visible = True
-                        # note time at which target was presented
-                        self.target_onset_time = self.evm.trial_time_ms
-
-                # log if & which object has been grasped
-                elif self.object_grasped is None:
-                    self.object_grasped = self.bounds.which_boundary(curr_pos)
-
-                # log time to taken to complete reach
-                else:
-                    self.nnc.shutdown()
-                    # NOTE: relative to rt/go-signal onset
-                    self.mt = self.evm.trial_time_ms - self.rt
-                    break
+        # log time to taken to complete reach
+        if object_grasped is not None:
+            # NOTE: relative to reach onset
+            self.mt = (perf_counter_ns() - reach_onset_ns) // 1_000_000
 
         # if reach window closes before object is grasped, trial is aborted
         if self.object_grasped is None:
             self.nnc.shutdown()
+            self.close_marker_file()
 
             # admonish participant
             fill()
             message("Too slow!", location=P.screen_c, registration=5, blit_txt=True)
             flip()
 
-            count = CountDown(0.5)
-
-            while count.counting():
-                _ = ui_request()
+            self.idle_wait(0.5)
 
             os.remove(self.ot.data_dir)
 
@@ -319,11 +457,13 @@ class GripApertureRedux(klibs.Experiment):
         clear()
 
         # Don't lock up system while waiting for trial to end
-        while self.evm.before("trial_timeout"):
-            _ = ui_request()
+        # NOTE: nothing to monitor here, so sleep between once-per-frame UI pumps
+        while evm.trial_time_ms < self.trial_times_out:
+            _ = ui()
+            sleep(UI_POLL_INTERVAL / 1000)
 
         # TODO: ask Anne & Kevin whether post-grasp data is worth recording
-        # self.nnc.shutdown()
+        # NOTE: for now, tracking continues until trial_clean_up
 
         return {
             "block_num": P.block_number,
@@ -345,7 +485,14 @@ class GripApertureRedux(klibs.Experiment):
         }
 
     def trial_clean_up(self):
-        pass
+        # stop marker tracking (unless already stopped by an aborted reach)
+        if not self.nnc.stop_threads:
+            self.nnc.shutdown()
+
+        self.close_marker_file()
+
+        if self.markers_dropped:
+            warnings.warn(f"{self.markers_dropped} marker sets dropped this trial.")
 
     def clean_up(self):
         pass
@@ -357,26 +504,45 @@ class GripApertureRedux(klibs.Experiment):
         if prep:
             message(
                 "Place props within size-matched rings.\n\nKeypress to start trial.",
-                location=[P.screen_c[0], P.screen_c[1] // 3],  # type: ignore[attr-defined]
+                location=self.prep_msg_loc,
             )
 
-        distractor_holder = self.placeholders[DISTRACTOR][self.distractor_size]  # type: ignore[attr-defined]
-        distractor_holder.fill = GRUE
+        for holder, loc in self.stimuli[target]:
+            blit(holder, registration=7, location=loc)
 
-        target_holder = self.placeholders[TARGET][self.target_size]  # type: ignore[attr-defined]
-        target_holder.fill = WHITE if target else GRUE
+        flip()
 
-        blit(
-            distractor_holder,
-            registration=5,
-            location=self.locs[self.distractor_loc],
-        )
-        blit(target_holder, registration=5, location=self.locs[self.target_loc])  # type: ignore[attr-defined]
+    def idle_wait(self, seconds: float, drain_ui: bool = True) -> None:
+        """Wait out a duration, sleeping (rather than spinning) between UI pumps.
 
-        flip()
+        Args:
+            seconds (float): Duration to wait.
+            drain_ui (bool, optional): Process UI events every 50ms. Defaults to True.
+        """
+        deadline = monotonic() + seconds
+        while True:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                break
+
+            sleep(min(remaining, 0.05))
+            if drain_ui:
+                _ = ui_request()
+
+    def goggles_cmd(self, cmd: bytes, drain: bool = True) -> None:
+        """Send a command to the goggles.
+
+        Args:
+            cmd (bytes): Command to send.
+            drain (bool, optional): Block until the command has been transmitted.
+                Defaults to True; skip where the caller can't afford the ~2ms wait.
+        """
+        self.goggles.write(cmd)
+        if drain:
+            self.goggles.flush()
 
     def marker_set_listener(self, marker_set: dict) -> None:
-        """Write marker set data to CSV file.
+        """Buffer marker set data for OptiTracker and queue it to be written to CSV file.
 
         Args:
             marker_set (dict): Dictionary containing marker data to be written.
@@ -384,22 +550,85 @@ class GripApertureRedux(klibs.Experiment):
         """
 
         if marker_set.get("label") == "hand":
-            # Append data to trial-specific CSV file
-            fname = self.ot.data_dir
-
-            # Timestamp marker data with relative trial time
-            header = list(marker_set["markers"][0].keys())
-            # header.append("trial_time")
-
-            # if file doesn't exist, create it and write header
-            if not os.path.exists(fname):
-                with open(fname, "w", newline="") as file:
-                    writer = DictWriter(file, fieldnames=header)
-                    writer.writeheader()
-
-            # append marker data to file
-            with open(fname, "a", newline="") as file:
-                writer = DictWriter(file, fieldnames=header)
-                for marker in marker_set.get("markers", None):
-                    if marker is not None:
-                        writer.writerow(marker)
+            # keep recent frames in memory, so position polling needn't read them back from disk
+            self.ot.add_frame(marker_set["markers"])
+
+            # NOTE: runs on the NatNet thread, so only hand data off to the writer
+            try:
+                self.marker_queue.put_nowait(marker_set["markers"])
+            except Full:
+                # better to lose a sample than to stall the stream
+                self.markers_dropped += 1
+
+    def close_marker_file(self) -> None:
+        """Close the current trial's marker file, once all queued sets are written."""
+        self.marker_queue.put(None)
+        self.marker_queue.join()
+
+    def marker_writer_loop(self) -> None:
+        """Drain queued marker sets to the current trial's CSV file.
+
+        Runs on a daemon thread. Queue items are either a file path (open a new
+        trial file), None (close the current file), or a list of markers to write.
+        """
+        file = writer = get_row = None
+
+        while True:
+            # block for the next item, then grab whatever else is already waiting
+            batch = [self.marker_queue.get()]
+            while len(batch) < MARKER_BATCH_SIZE:
+                try:
+                    batch.append(self.marker_queue.get_nowait())
+                except Empty:
+                    break
+
+            # NOTE: errors are reported rather than raised; should this thread die,
+            # close_marker_file() would wait on the queue forever
+            try:
+                for item in batch:
+                    try:
+                        if isinstance(item, str):
+                            # sized to hold a full batch, so each flush is a single write
+                            file = open(item, "w", newline="", buffering=MARKER_WRITE_BUFFER)
+                            writer = csv_writer(file)
+                            get_row = None
+
+                        elif item is None:
+                            if file is not None:
+                                file.close()
+                            file = None
+
+                        elif file is not None:
+                            markers = [marker for marker in item if marker is not None]
+                            if not markers:
+                                continue
+
+                            # field order is only known once markers arrive
+                            if get_row is None:
+                                fields = tuple(markers[0].keys())
+                                writer.writerow(fields)
+                                # NOTE: pulls a marker's values as a row tuple in one C call
+                                get_row = itemgetter(*fields)
+
+                            writer.writerows(map(get_row, markers))
+
+                    except OSError as e:
+                        warnings.warn(
+                            f"Marker data could not be written, skipping trial file: {e}"
+                        )
+                        # drop the file, so the rest of this trial isn't retried row by row
+                        if file is not None:
+                            with suppress(OSError):
+                                file.close()
+                        file = None
+
+                # NOTE: OptiTracker reads positions from this file, so flush every batch
+                if file is not None:
+                    try:
+                        file.flush()
+                    except OSError as e:
+                        warnings.warn(f"Marker data could not be flushed: {e}")
+
+            finally:
+                for _ in batch:
+                    self.marker_queue.task_done()